@@ -1,15 +1,14 @@
+import hashlib
 import http.server
-import math
-import socketserver
-import json
 import logging
 import threading
 import time
 import traceback
 import os
 import sys
-from typing import Dict
+from typing import Dict, Iterable, Optional
 
+import orjson
 import pandas as pd
 
 # Configure logging
@@ -64,7 +63,25 @@ except Exception as e:
     logger.error(traceback.format_exc())
     sys.exit(1)
 
+def dump_json(payload) -> bytes:
+    """Serialize a response payload to JSON bytes"""
+    return orjson.dumps(
+        payload,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        default=str
+    )
+
 class LeaderboardHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 is required for chunked responses; every reply sets its length or is chunked
+    protocol_version = 'HTTP/1.1'
+    # Keep-alive connections would otherwise pin a server thread while idle
+    timeout = 30
+
+    def send_response(self, code, message=None):
+        """Send the status line, remembering that the response has started"""
+        self.response_started = True
+        super().send_response(code, message)
+
     def send_cors_headers(self):
         """Send CORS headers"""
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -75,79 +92,134 @@ class LeaderboardHandler(http.server.SimpleHTTPRequestHandler):
         """Handle OPTIONS requests for CORS"""
         self.send_response(200)
         self.send_cors_headers()
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_cache_headers(self, etag: str):
+        """Send HTTP caching headers"""
+        self.send_header('Cache-Control', f'public, max-age={kaggle_service.refresh_interval}')
+        self.send_header('ETag', etag)
+
+    def etag_matches(self, etag: str) -> bool:
+        """Whether If-None-Match lists etag, using weak comparison (RFC 9110)"""
+        header = self.headers.get('If-None-Match')
+        if not header:
+            return False
+        tags = [tag.strip() for tag in header.split(',')]
+        return '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+    def send_json(self, payload, etag: Optional[str] = None):
+        """Send a JSON response with CORS and, if given, caching headers"""
+        body = dump_json(payload)
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_cors_headers()
+        if etag is not None:
+            self.send_cache_headers(etag)
         self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, chunk: bytes):
+        """Write one chunk of a chunked transfer-encoded body"""
+        if chunk:
+            self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+
+    def send_json_records(self, records: Iterable[dict], extra: Dict, etag: str, batch_size: int = 256):
+        """Stream {"data": [records...], **extra} as a chunked JSON response.
+
+        Records are serialized and sent in batches, so encoding overlaps with
+        sending and the full body is never held in memory.
+        """
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_cors_headers()
+        self.send_cache_headers(etag)
+        self.end_headers()
+
+        self.write_chunk(b'{"data":[')
+        separator = b''
+        batch = []
+        for record in records:
+            batch.append(dump_json(record))
+            if len(batch) == batch_size:
+                self.write_chunk(separator + b','.join(batch))
+                separator = b','
+                batch = []
+        if batch:
+            self.write_chunk(separator + b','.join(batch))
+
+        # Splice the extra keys in after the array by dropping their opening brace
+        self.write_chunk(b'],' + dump_json(extra)[1:] if extra else b']}')
+        self.wfile.write(b'0\r\n\r\n')
 
     def do_GET(self):
         """Handle GET requests"""
+        self.response_started = False
         if self.path == '/api/leaderboard':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_cors_headers()
-            self.end_headers()
-            
             try:
                 if kaggle_service is None:
-                    self.wfile.write(json.dumps({
+                    self.send_json({
                         "error": "Kaggle service not initialized"
-                    }).encode())
+                    })
                     return
                 
-                final_scores = kaggle_service.calculate_final_score(competitions)
+                breakdown = kaggle_service.calculate_score_breakdown(competitions)
+                etag = '"{}"'.format(hashlib.md5(
+                    pd.util.hash_pandas_object(breakdown).values.tobytes()
+                ).hexdigest())
                 
-                if final_scores.empty:
-                    self.wfile.write(json.dumps({"data": []}).encode())
+                if self.etag_matches(etag):
+                    self.send_response(304)
+                    self.send_cors_headers()
+                    self.send_cache_headers(etag)
+                    self.end_headers()
                     return
                 
-                # Transform DataFrame to list of dicts for JSON response
-                result = []
-                for _, row in final_scores.iterrows():
-                    team_scores = []
-                    for competition, weight in competitions.items():
-                        try:
-                            if competition.startswith("csv-challenge"):
-                                # ydi CSV challenges
-                                csv_file = f"{competition}.csv"
-                                if os.path.exists(csv_file):
-                                    csv_data = pd.read_csv(csv_file)
-                                    team_position = csv_data[csv_data['teamName'] == row['teamName']].index
-                                    score = float(36 * math.exp(-0.2 * team_position[0]) * weight) if len(team_position) > 0 else 0.0
-                                else:
-                                    score = 0.0
-                            else:
-                                # ydi Kaggle competitions
-                                comp_data = kaggle_service._cached_leaderboards.get(competition, None)
-                                if comp_data is not None and not comp_data.empty:
-                                    team_row = comp_data[comp_data['teamName'] == row['teamName']]
-                                    score = float(team_row.iloc[0]['score'] * weight) if not team_row.empty else 0.0
-                                else:
-                                    score = 0.0
-                            team_scores.append(score)
-                        except Exception as e:
-                            logger.error(f"Error calculating score for {row['teamName']} in {competition}: {e}")
-                            team_scores.append(0.0)
-                    
-                    result.append({
-                        "rank": int(row['rank']),
-                        "team": row['teamName'],
-                        "scores": team_scores,
-                        "total": float(row['weighted_points'])
-                    })
+                if breakdown.empty:
+                    self.send_json({"data": []}, etag)
+                    return
                 
-                response_data = {
-                    "data": result,
-                    "competitions": list(competitions.keys())
-                }
+                # Per-competition weighted points come straight from the pivot
+                competition_scores = breakdown[list(competitions)].to_numpy(dtype=float).tolist()
+                
+                # Transform DataFrame to dicts for the JSON response,
+                # unboxing each column to plain Python values in one call
+                result = (
+                    {
+                        "rank": rank,
+                        "team": team,
+                        "scores": team_scores,
+                        "total": total
+                    }
+                    for rank, team, team_scores, total in zip(
+                        breakdown['rank'].to_numpy(dtype=int).tolist(),
+                        breakdown['teamName'].astype(str).tolist(),
+                        competition_scores,
+                        breakdown['weighted_points'].to_numpy(dtype=float).tolist()
+                    )
+                )
                 
-                self.wfile.write(json.dumps(response_data, default=str).encode())
+                self.send_json_records(result, {"competitions": list(competitions.keys())}, etag)
                 
             except Exception as e:
-                logger.error(e)       
+                logger.error(e)
+                if self.response_started:
+                    # Too late for an error status; drop the connection so the
+                    # client sees a truncated body rather than a corrupted one
+                    self.close_connection = True
+                else:
+                    self.send_error(500)
+        else:
+            self.send_error(404)
         
 if __name__ == "__main__":
     PORT = 8000
     
     try:
-        with socketserver.TCPServer(("", PORT), LeaderboardHandler) as httpd:
+        # One thread per request so a slow leaderboard build does not queue the others
+        with http.server.ThreadingHTTPServer(("", PORT), LeaderboardHandler) as httpd:
             print(f"Serving at http://localhost:{PORT}")
             print(f"Test endpoint: http://localhost:{PORT}/test")
             print(f"Leaderboard endpoint: http://localhost:{PORT}/api/leaderboard")
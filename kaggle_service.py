@@ -1,9 +1,13 @@
 import os
 import logging
+import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Optional
 from kaggle.api.kaggle_api_extended import KaggleApi
+from urllib3.util.retry import Retry
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
 import math
 import time
 from datetime import datetime
@@ -16,7 +20,33 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+def _position_points(n: int) -> np.ndarray:
+    """Points for positions 0..n-1 with base points of 36"""
+    return 36.0 * np.exp(-0.2 * np.arange(n, dtype=np.float64))
+
+@functools.lru_cache(maxsize=32)
+def _load_csv_leaderboard(path: str, mtime: float) -> pd.DataFrame:
+    """Parse and score a CSV leaderboard; mtime is part of the cache key so edits invalidate it"""
+    df = pd.read_csv(path)
+    if 'teamId' not in df.columns:
+        df['teamId'] = pd.util.hash_array(df['teamName'].astype(str).to_numpy())
+    df['teamName'] = df['teamName'].astype('category')
+    df['score'] = _position_points(len(df))
+    return df
+
+def read_leaderboard_csv(path: str) -> pd.DataFrame:
+    """Return the scored CSV leaderboard at path, reprocessing only when it changes.
+
+    The returned frame is shared between callers and must not be mutated.
+    """
+    return _load_csv_leaderboard(path, os.path.getmtime(path))
+
 class LeaderboardObserver(ABC):
+    """Receives leaderboard updates.
+
+    The frames passed to update are shared with the service's caches and
+    must be treated as read-only; copy them before modifying.
+    """
     @abstractmethod
     def update(self, competition_name: str, leaderboard_data: pd.DataFrame, changes: Optional[pd.DataFrame] = None):
         pass
@@ -31,13 +61,13 @@ class LeaderboardAnalytics(LeaderboardObserver):
         
         self.leaderboard_history[competition_name] = {
             'timestamp': timestamp,
-            'data': leaderboard_data.copy()
+            'data': leaderboard_data
         }
         
         if changes is not None and not changes.empty:
             self.score_changes[competition_name] = {
                 'timestamp': timestamp,
-                'changes': changes.copy()
+                'changes': changes
             }
             
             for _, change in changes.iterrows():
@@ -51,6 +81,11 @@ class LeaderboardAnalytics(LeaderboardObserver):
                     )
 
 class KaggleService:
+    CHANGE_COLUMNS = [
+        'teamId', 'teamName', 'change_type', 'old_position',
+        'new_position', 'old_score', 'new_score'
+    ]
+
     def __init__(self, refresh_interval: int = 300):
         # Check for kaggle.json
         kaggle_dir = os.path.expanduser('~/.kaggle')
@@ -72,25 +107,57 @@ class KaggleService:
             self.api.config_path = os.path.expanduser("~/.kaggle/kaggle.json")  # Assure-toi que le fichier existe
             self.api.authenticate()
             logging.info("Successfully authenticated with Kaggle API")
+            self._configure_connection_pool()
         except Exception as e:
             logging.error(f"Failed to authenticate with Kaggle API: {e}")
             raise
 
         self._observers: List[LeaderboardObserver] = []
         self._cached_leaderboards: Dict[str, pd.DataFrame] = {}
+        self._response_cache: Dict[str, Tuple[float, pd.DataFrame]] = {}
+        self._cache_lock = threading.Lock()
         self._competitions: Dict[str, float] = {}
         self.refresh_interval = refresh_interval
         self._monitoring = False
         self._monitor_thread = None
+        self._wake_event = threading.Event()
 
         # Define the list of CSV challenges
         self.csv_challenges = ["csv-challenge-1", "csv-challenge-2", "csv-challenge-3", "csv-challenge-4", "csv-challenge-5"]
+        self._preload_csv_challenges()
+
+    def _preload_csv_challenges(self):
+        """Parse the CSV challenges up front so the first request does not pay for it"""
+        for competition_name in self.csv_challenges:
+            csv_file = f"{competition_name}.csv"
+            if os.path.exists(csv_file):
+                try:
+                    read_leaderboard_csv(csv_file)
+                except Exception as e:
+                    logging.error(f"Error preloading CSV file for {competition_name}: {e}")
+
+    def _configure_connection_pool(self, maxsize: int = 16):
+        """Size the Kaggle client's keep-alive pool for concurrent fetches and retry transient errors"""
+        rest_client = getattr(getattr(self.api, 'api_client', None), 'rest_client', None)
+        pool_manager = getattr(rest_client, 'pool_manager', None)
+        if pool_manager is None:
+            logging.warning("Kaggle API client does not expose its connection pool, using defaults")
+            return
+
+        pool_manager.connection_pool_kw.update(
+            maxsize=maxsize,
+            block=False,
+            retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        # Drop pools created with the old settings; new ones pick up the config above
+        pool_manager.clear()
 
     def start_monitoring(self, competitions: Dict[str, float]):
         """Start monitoring the specified competitions"""
         self._competitions = competitions
         if not self._monitoring:
             self._monitoring = True
+            self._wake_event.clear()
             self._monitor_thread = threading.Thread(target=self._monitor_leaderboards)
             self._monitor_thread.daemon = True
             self._monitor_thread.start()
@@ -98,37 +165,59 @@ class KaggleService:
     def stop_monitoring(self):
         """Stop monitoring competitions"""
         self._monitoring = False
+        self._wake_event.set()
         if self._monitor_thread:
             self._monitor_thread.join()
 
+    def force_refresh(self):
+        """Wake the monitoring loop to poll all competitions immediately"""
+        self._wake_event.set()
+
     def _monitor_leaderboards(self):
         """Continuously monitor leaderboards for changes"""
         while self._monitoring:
             for competition_name in self._competitions:
                 try:
-                    self.fetch_leaderboard_data(competition_name)
+                    self.fetch_leaderboard_data(competition_name, use_cache=False)
                 except Exception as e:
                     logging.error(f"Error monitoring competition {competition_name}: {e}")
-            time.sleep(self.refresh_interval)
+            # Waiting on an event lets stop_monitoring and force_refresh cut the pause short
+            self._wake_event.wait(self.refresh_interval)
+            self._wake_event.clear()
 
     def calculate_position_points(self, position: int) -> float:
         """Calculate points based on position with base points of 36"""
         return float(36 * math.exp(-0.2 * position))
 
-    def fetch_leaderboard_data(self, competition_name: str) -> pd.DataFrame:
-        """Fetch and process competition leaderboard data"""
+    def _get_cached_response(self, competition_name: str) -> Optional[pd.DataFrame]:
+        """Return the last fetched leaderboard if it is younger than refresh_interval"""
+        with self._cache_lock:
+            entry = self._response_cache.get(competition_name)
+        if entry is None:
+            return None
+        fetched_at, df = entry
+        if time.monotonic() - fetched_at >= self.refresh_interval:
+            return None
+        return df
+
+    def fetch_leaderboard_data(self, competition_name: str, use_cache: bool = True) -> pd.DataFrame:
+        """Fetch and process competition leaderboard data.
+
+        The returned frame may be shared with the cache and must not be mutated.
+        """
         try:
             if competition_name in self.csv_challenges:
                 try:
-                    df = pd.read_csv(f"{competition_name}.csv")
-                    if 'teamId' not in df.columns:
-                        df['teamId'] = df['teamName'].apply(lambda x: hash(x))
-                    df['score'] = df.index.to_series().apply(self.calculate_position_points)
-                    return df
+                    return read_leaderboard_csv(f"{competition_name}.csv")
                 except Exception as e:
                     logging.error(f"Error reading CSV file for {competition_name}: {e}")
                     return pd.DataFrame()
 
+            if use_cache:
+                cached = self._get_cached_response(competition_name)
+                if cached is not None:
+                    return cached
+
             try:
                 leaderboard = self.api.competition_view_leaderboard(competition_name)
                 
@@ -146,22 +235,37 @@ class KaggleService:
                 df = pd.DataFrame(data)
                 
                 if 'teamId' not in df.columns and 'teamName' in df.columns:
-                    df['teamId'] = df['teamName'].apply(lambda x: hash(x))
+                    df['teamId'] = pd.util.hash_array(df['teamName'].astype(str).to_numpy())
+
+                # Dictionary-encode team names and shrink integer ids
+                if 'teamName' in df.columns:
+                    df['teamName'] = df['teamName'].astype('category')
+                if 'teamId' in df.columns and pd.api.types.is_integer_dtype(df['teamId']):
+                    df['teamId'] = pd.to_numeric(df['teamId'], downcast='integer')
                 
-                df['score'] = df.index.to_series().apply(self.calculate_position_points)
+                df['score'] = _position_points(len(df))
 
+                notify = False
                 changes = None
-                if competition_name in self._cached_leaderboards:
-                    old_df = self._cached_leaderboards[competition_name]
-                    changes = self._detect_changes(old_df, df)
-                    
-                    if not changes.empty:
-                        self._cached_leaderboards[competition_name] = df.copy()
+                with self._cache_lock:
+                    if competition_name in self._cached_leaderboards:
+                        old_df = self._cached_leaderboards[competition_name]
+                        changes = self._detect_changes(old_df, df)
+
+                        if not changes.empty:
+                            self._cached_leaderboards[competition_name] = df
+                            notify = True
+                    else:
+                        self._cached_leaderboards[competition_name] = df
+                        notify = True
+                    self._response_cache[competition_name] = (time.monotonic(), df)
+
+                if notify:
+                    if changes is not None:
                         self.notify_observers(competition_name, df, changes)
                         logging.info(f"Changes detected in {competition_name} leaderboard")
-                else:
-                    self._cached_leaderboards[competition_name] = df.copy()
-                    self.notify_observers(competition_name, df)
+                    else:
+                        self.notify_observers(competition_name, df)
                 
                 return df
 
@@ -175,36 +279,35 @@ class KaggleService:
 
     def _detect_changes(self, old_df: pd.DataFrame, new_df: pd.DataFrame) -> pd.DataFrame:
         """Detect changes between old and new leaderboard data"""
-        changes = []
-        
-        for index, row in new_df.iterrows():
-            team_id = row['teamId']
-            old_team_data = old_df[old_df['teamId'] == team_id]
-            
-            if old_team_data.empty:
-                changes.append({
-                    'teamId': team_id,
-                    'teamName': row['teamName'],
-                    'change_type': 'new_entry',
-                    'old_position': None,
-                    'new_position': index,
-                    'old_score': None,
-                    'new_score': row['score']
-                })
-            else:
-                old_position = old_team_data.index[0]
-                if old_position != index or old_team_data.iloc[0]['score'] != row['score']:
-                    changes.append({
-                        'teamId': team_id,
-                        'teamName': row['teamName'],
-                        'change_type': 'position_change',
-                        'old_position': old_position,
-                        'new_position': index,
-                        'old_score': old_team_data.iloc[0]['score'],
-                        'new_score': row['score']
-                    })
-                    
-        return pd.DataFrame(changes)
+        # Unchanged standings are the common case; skip the join entirely
+        if (
+            old_df.index.equals(new_df.index) and
+            np.array_equal(old_df['teamId'].to_numpy(), new_df['teamId'].to_numpy()) and
+            np.array_equal(old_df['score'].to_numpy(), new_df['score'].to_numpy())
+        ):
+            return pd.DataFrame(columns=self.CHANGE_COLUMNS)
+
+        # Index the old leaderboard by team so each new row is matched with one join
+        old = pd.DataFrame(
+            {'old_position': old_df.index, 'old_score': old_df['score'].to_numpy()},
+            index=old_df['teamId']
+        )
+        old = old[~old.index.duplicated()]
+
+        joined = new_df[['teamId', 'teamName', 'score']].join(old, on='teamId')
+        joined['new_position'] = new_df.index
+
+        is_new = joined['old_position'].isna()
+        moved = ~is_new & (
+            (joined['old_position'] != joined['new_position']) |
+            (joined['old_score'] != joined['score'])
+        )
+
+        changes = joined[is_new | moved].rename(columns={'score': 'new_score'})
+        changes['change_type'] = np.where(is_new[is_new | moved], 'new_entry', 'position_change')
+        changes['old_position'] = changes['old_position'].astype('Int64')
+
+        return changes[self.CHANGE_COLUMNS].reset_index(drop=True)
 
     def attach(self, observer: LeaderboardObserver):
         """Attach an observer to the service"""
@@ -220,29 +323,73 @@ class KaggleService:
         for observer in self._observers:
             observer.update(competition_name, leaderboard_data, changes)
 
+    def _collect_weighted_points(self, competitions: Dict[str, float]) -> pd.DataFrame:
+        """Fetch every competition and return one row of weighted points per team entry"""
+        if not competitions:
+            return pd.DataFrame()
+
+        results_by_competition = {}
+        with ThreadPoolExecutor(max_workers=min(8, len(competitions))) as executor:
+            futures = {
+                executor.submit(self.fetch_leaderboard_data, competition): (competition, weight)
+                for competition, weight in competitions.items()
+            }
+            for future in as_completed(futures):
+                competition, weight = futures[future]
+                try:
+                    df = future.result()
+                    if not df.empty and 'teamName' in df.columns:
+                        result_df = df[['teamName']].copy()
+                        result_df['weighted_points'] = df['score'] * weight
+                        result_df['competition'] = competition
+                        results_by_competition[competition] = result_df
+
+                except Exception as e:
+                    logging.error(f"Error processing competition '{competition}': {e}")
+
+        # Keep the concatenation order stable regardless of completion order
+        all_results = [results_by_competition[c] for c in competitions if c in results_by_competition]
+
+        if not all_results:
+            return pd.DataFrame()
+        if len(all_results) == 1:
+            return all_results[0]
+        return pd.concat(all_results, ignore_index=True)
+
     def calculate_final_score(self, competitions: Dict[str, float]) -> pd.DataFrame:
         """Calculate final scores across all competitions"""
-        all_results = []
-        
-        for competition, weight in competitions.items():
-            try:
-                df = self.fetch_leaderboard_data(competition)
-                if not df.empty and 'teamName' in df.columns:
-                    weighted_df = df.copy()
-                    weighted_df['weighted_points'] = weighted_df['score'] * weight
-                    result_df = weighted_df[['teamName', 'weighted_points']].copy()
-                    result_df.loc[:, 'competition'] = competition
-                    all_results.append(result_df)
-                
-            except Exception as e:
-                logging.error(f"Error processing competition '{competition}': {e}")
-                
-        if not all_results:
+        final_results = self._collect_weighted_points(competitions)
+        if final_results.empty:
             return pd.DataFrame()
             
-        final_results = pd.concat(all_results, ignore_index=True)
-        final_results = final_results.groupby(['teamName'], as_index=False)['weighted_points'].sum()
-        final_results = final_results.sort_values(by='weighted_points', ascending=False).reset_index(drop=True)
-        final_results['rank'] = final_results.index + 1
+        totals = (
+            final_results.groupby('teamName', observed=True, sort=False)['weighted_points']
+            .sum()
+            .sort_values(ascending=False)
+        )
+        final_results = totals.reset_index()
+        final_results['rank'] = np.arange(1, len(final_results) + 1, dtype=np.int32)
         
-        return final_results
\ No newline at end of file
+        return final_results
+
+    def calculate_score_breakdown(self, competitions: Dict[str, float]) -> pd.DataFrame:
+        """Calculate final scores with one weighted points column per competition"""
+        results = self._collect_weighted_points(competitions)
+        if results.empty:
+            return pd.DataFrame()
+
+        breakdown = results.pivot_table(
+            index='teamName',
+            columns='competition',
+            values='weighted_points',
+            aggfunc='sum',
+            fill_value=0.0,
+            observed=True
+        ).reindex(columns=list(competitions), fill_value=0.0)
+        breakdown.columns.name = None
+
+        breakdown['weighted_points'] = breakdown.sum(axis=1)
+        breakdown = breakdown.sort_values(by='weighted_points', ascending=False).reset_index()
+        breakdown['rank'] = np.arange(1, len(breakdown) + 1, dtype=np.int32)
+
+        return breakdown
@@ -1,26 +1,88 @@
 import os
 import json
+import atexit
+import asyncio
+import hashlib
+import importlib
+import io
 import logging
+import operator
+import queue
+import threading
+from itertools import islice
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-import kaggle
-import pandas as pd
-from time import sleep
-from datetime import datetime
+import orjson
+import requests
+from time import sleep, time
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+# Log records are queued and written by a background listener so pollers never block on I/O
+log_handlers = [
+    logging.FileHandler('kaggle_leaderboard.log'),
+    logging.StreamHandler()
+]
+for handler in log_handlers:
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+log_queue = queue.SimpleQueue()
+queue_handler = QueueHandler(log_queue)
+# Pass the bare message through; the listener's handlers apply the real format
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('kaggle_leaderboard.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[queue_handler]
 )
+log_listener = QueueListener(log_queue, *log_handlers)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+# Upper bound for the polling interval while the leaderboard stays unchanged
+MAX_REFRESH_INTERVAL = 600
+
+# Size above which the reusable CSV buffer is released after a write
+CSV_BUFFER_LIMIT = 128 * 1024
+
+def _pd():
+    """Import pandas on first use; it dominates start-up time otherwise"""
+    return importlib.import_module('pandas')
+
+LEADERBOARD_PATH = '/competitions/{competition}/leaderboard/view'
+
+LEADERBOARD_COLUMNS = ('teamId', 'teamName', 'submissionDate', 'score')
+
+def available_columns(entry):
+    """The leaderboard columns present on a raw API entry, in LEADERBOARD_COLUMNS order"""
+    if isinstance(entry, dict):
+        fields = frozenset(entry)
+    else:
+        fields = frozenset(col for col in LEADERBOARD_COLUMNS if hasattr(entry, col))
+    return tuple(col for col in LEADERBOARD_COLUMNS if col in fields)
+
+def select_columns(entry, columns=None):
+    """Pick the leaderboard columns from a raw API entry"""
+    if columns is None:
+        columns = available_columns(entry)
+    if isinstance(entry, dict):
+        return {col: entry.get(col) for col in columns}
+    return {col: getattr(entry, col, None) for col in columns}
 
 class KaggleLeaderboardService:
     def __init__(self):
         load_dotenv()
         self.setup_credentials()
+        # Importing kaggle authenticates (once), so it must happen after the credentials exist
+        self.api = importlib.import_module('kaggle').api
+        self.configure_connection_pool()
+        self._etags = {}
+        self._last_digest = {}
+        self._miss_streak = {}
+        self._extract = None
+        self._columns = None
+        self._csv_buffer = io.BytesIO()
+        self._csv_lock = threading.Lock()
         
     def setup_credentials(self):
         kaggle_json = {
@@ -29,48 +91,174 @@ class KaggleLeaderboardService:
         }
         kaggle_dir = Path.home() / '.kaggle'
         kaggle_dir.mkdir(exist_ok=True)
-        with open(kaggle_dir / 'kaggle.json', 'w') as f:
+        credentials_file = kaggle_dir / 'kaggle.json'
+        
+        # Skip the rewrite when the stored credentials are already current
+        if credentials_file.exists():
+            try:
+                with open(credentials_file) as f:
+                    if json.load(f) == kaggle_json:
+                        return
+            except (OSError, ValueError):
+                pass
+        
+        with open(credentials_file, 'w') as f:
             json.dump(kaggle_json, f)
-        os.chmod(kaggle_dir / 'kaggle.json', 0o600)
+        os.chmod(credentials_file, 0o600)
     
 
         
-    def fetch_leaderboard(self, competition_name, refresh_interval=30):
-        while True:
+    def configure_connection_pool(self):
+        # Leaderboards are fetched over one keep-alive session that retries
+        # transient API errors, authenticated with the same credentials as the SDK
+        self.session = requests.Session()
+        self.session.auth = (
+            self.api.config_values[self.api.CONFIG_NAME_USER],
+            self.api.config_values[self.api.CONFIG_NAME_KEY]
+        )
+        # Honour the SDK's configured endpoint (KAGGLE_API_ENDPOINT), proxy and CA bundle
+        configuration = self.api.api_client.configuration
+        self._api_host = configuration.host.rstrip('/')
+        if configuration.proxy:
+            self.session.proxies = {'http': configuration.proxy, 'https': configuration.proxy}
+        if not configuration.verify_ssl:
+            self.session.verify = False
+        elif configuration.ssl_ca_cert:
+            self.session.verify = configuration.ssl_ca_cert
+        self.size_connection_pool(4)
+        
+    def size_connection_pool(self, pool_maxsize):
+        # Keep one pooled connection per concurrent poll; urllib3 discards the extras otherwise
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        ))
+        
+    def _to_frame(self, entries):
+        """Build a DataFrame holding only the leaderboard columns present in the entries"""
+        pd = _pd()
+        entries = list(entries)
+        # The schema rarely changes, so work out which columns exist only once
+        if self._columns is None and entries:
+            self._columns = available_columns(entries[0])
+        df = pd.DataFrame([select_columns(entry, self._columns) for entry in entries])
+        if 'submissionDate' in df.columns:
+            # Kaggle dates are ISO-8601, so use the fixed-format parser rather than inference
+            df['submissionDate'] = pd.to_datetime(df['submissionDate'], format='ISO8601', cache=True, errors='coerce')
+        return df
+        
+    def _write_csv(self, df, filename):
+        # Format into one reused buffer and hand it to the file in a single write
+        with self._csv_lock:
+            # Overwrite from the start without truncating, so the buffer keeps its
+            # storage; only the first `length` bytes belong to this snapshot
+            self._csv_buffer.seek(0)
+            df.to_csv(self._csv_buffer, index=False)
+            length = self._csv_buffer.tell()
+            
+            fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
             try:
-                kaggle.api.authenticate()
-                leaderboard = kaggle.api.competition_view_leaderboard(competition_name)
-                
-                # Convert leaderboard object to DataFrame
-                if hasattr(leaderboard, 'entries'):
-                    data = leaderboard.entries
-                else:
-                    # Handle new API format
-                    data = leaderboard['submissions'] if isinstance(leaderboard, dict) else leaderboard
-                
-                df = pd.DataFrame(data)
-                
-                # Flexible column selection
-                columns = ['teamId', 'teamName', 'submissionDate', 'score']
-                available_columns = [col for col in columns if col in df.columns]
-                df = df[available_columns]
-                
-                if 'submissionDate' in df.columns:
-                    df['submissionDate'] = pd.to_datetime(df['submissionDate'])
-                
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'leaderboard_{timestamp}.csv'
-               # df.to_csv(filename, index=False)
-                
-                logging.info(f"Leaderboard updated: {filename}")
-                logging.info(f"Current standings:\n{df.head().to_string()}")
-                
-                sleep(refresh_interval)
-                
-            except Exception as e:
-                logging.error(f"Error fetching leaderboard: {e}")
-                sleep(refresh_interval)
+                with self._csv_buffer.getbuffer() as view, view[:length] as data:
+                    written = 0
+                    while written < length:
+                        written += os.write(fd, data[written:])
+            finally:
+                os.close(fd)
+            
+            # Don't hold on to the memory of an unusually large leaderboard
+            if length > CSV_BUFFER_LIMIT:
+                self._csv_buffer = io.BytesIO()
+        
+    @staticmethod
+    def _resolve_extractor(leaderboard):
+        # Pick how to pull the submission list out of this API response shape
+        if hasattr(leaderboard, 'entries'):
+            return operator.attrgetter('entries')
+        # Handle new API format
+        if isinstance(leaderboard, dict):
+            return operator.itemgetter('submissions')
+        return lambda leaderboard: leaderboard
+        
+    def fetch_once(self, competition_name):
+        """Fetch a leaderboard's raw entries, or None if unchanged since the last fetch"""
+        # Kaggle answers 304 with an empty body when our cached ETag is still current
+        etag = self._etags.get(competition_name)
+        response = self.session.get(
+            self._api_host + LEADERBOARD_PATH.format(competition=competition_name),
+            headers={'If-None-Match': etag} if etag else {},
+            timeout=30
+        )
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        if response.headers.get('ETag'):
+            self._etags[competition_name] = response.headers['ETag']
+        else:
+            # Don't keep revalidating against a tag the server no longer sends
+            self._etags.pop(competition_name, None)
+        leaderboard = orjson.loads(response.content)
+        
+        # The response shape doesn't change between polls, so resolve it only once
+        if self._extract is None:
+            self._extract = self._resolve_extractor(leaderboard)
+        data = self._extract(leaderboard)
+        
+        # Not every response carries an ETag, so still compare payload digests
+        digest = hashlib.blake2b(orjson.dumps(data, option=orjson.OPT_SORT_KEYS, default=str)).digest()
+        if digest == self._last_digest.get(competition_name):
+            return None
+        self._last_digest[competition_name] = digest
+        return data
+        
+    def poll_leaderboard(self, competition_name, refresh_interval=30, save_csv=False):
+        """Fetch one competition's leaderboard once and return the delay before the next poll"""
+        try:
+            data = self.fetch_once(competition_name)
+            
+            # Back off while the leaderboard is unchanged, skipping all processing
+            if data is None:
+                self._miss_streak[competition_name] = self._miss_streak.get(competition_name, 0) + 1
+                return min(refresh_interval * 2 ** self._miss_streak[competition_name], MAX_REFRESH_INTERVAL)
+            self._miss_streak[competition_name] = 0
+            
+            # Competitions are polled concurrently, so the timestamp alone isn't unique
+            filename = f'leaderboard_{competition_name}_{int(time())}.csv'
+            if save_csv:
+                self._write_csv(self._to_frame(data), filename)
+            
+            logging.info(f"Leaderboard updated for {competition_name}: {filename}")
+            # Only the logged preview needs a DataFrame, so skip it when it would be dropped
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                preview = self._to_frame(islice(data, 5))
+                logging.info(f"Current standings:\n{preview.to_string()}")
+            
+        except Exception as e:
+            logging.error(f"Error fetching leaderboard for {competition_name}: {e}")
+        
+        return refresh_interval
+        
+    def fetch_leaderboard(self, competition_name, refresh_interval=30, save_csv=False):
+        while True:
+            sleep(self.poll_leaderboard(competition_name, refresh_interval, save_csv))
+    
+    async def _watch_leaderboard(self, competition_name, refresh_interval, save_csv):
+        while True:
+            # The Kaggle SDK is blocking, so each poll runs in the default executor
+            delay = await asyncio.to_thread(self.poll_leaderboard, competition_name, refresh_interval, save_csv)
+            await asyncio.sleep(delay)
+    
+    async def watch_leaderboards(self, competition_names, refresh_interval=30, save_csv=False):
+        """Poll several competitions concurrently from a single event loop"""
+        competition_names = list(competition_names)
+        self.size_connection_pool(max(4, len(competition_names)))
+        await asyncio.gather(*(
+            self._watch_leaderboard(name, refresh_interval, save_csv)
+            for name in competition_names
+        ))
 
 if __name__ == "__main__":
     service = KaggleLeaderboardService()
-    service.fetch_leaderboard(os.getenv("KAGGLE_SLUG"))
\ No newline at end of file
+    # KAGGLE_SLUG may list several competitions separated by commas
+    slugs = [slug.strip() for slug in os.getenv("KAGGLE_SLUG", "").split(",") if slug.strip()]
+    asyncio.run(service.watch_leaderboards(slugs))
@@ -1,9 +1,11 @@
+import os
+import orjson
 from flask import Flask
 from flask_socketio import SocketIO, emit
 import threading
 import time
 from dotenv import load_dotenv
-from kaggle_leaderboard_service import KaggleLeaderboardService  # Assuming this is your service class
+from kaggle_leaderboard_service import KaggleLeaderboardService, available_columns, select_columns  # Assuming this is your service class
 
 # Initialize Flask and SocketIO
 app = Flask(__name__)
@@ -12,31 +14,62 @@ socketio = SocketIO(app)
 # Load environment variables
 load_dotenv()
 
-# Initialize the KaggleLeaderboardService
-service = KaggleLeaderboardService()
-
-# Define the leaderboard data variable
-leaderboard_data = {}
+# Latest leaderboard shared by all clients; the version bumps on every change.
+# The payload is serialized once and the same bytes are sent to every client.
+snapshot_lock = threading.Lock()
+leaderboard_snapshot = {'version': 0, 'records': b'[]', 'payload': b''}
 
 def background_fetch_leaderboard():
-    global leaderboard_data
+    global leaderboard_snapshot
+    # Created here rather than at import so the web server starts without waiting on it;
+    # a failed setup (e.g. bad credentials) is retried on the next tick
+    service = None
+    next_tick = time.monotonic()
+    columns = None
     while True:
         try:
-            # Fetch leaderboard data
-            leaderboard_data = service.fetch_leaderboard(os.getenv("KAGGLE_SLUG"))
-            # Emit the leaderboard data to all connected clients
-            socketio.emit('update_leaderboard', leaderboard_data)
-            time.sleep(30)
+            if service is None:
+                service = KaggleLeaderboardService()
+            # Fetch leaderboard data; None means nothing changed since the last fetch
+            data = service.fetch_once(os.getenv("KAGGLE_SLUG"))
+            if data is not None:
+                # The schema rarely changes, so work out which columns exist only once
+                if columns is None and data:
+                    columns = available_columns(data[0])
+                records = orjson.dumps([select_columns(entry, columns) for entry in data])
+                snapshot = None
+                with snapshot_lock:
+                    # Fields we don't publish may have changed; skip identical payloads
+                    if records != leaderboard_snapshot['records']:
+                        version = leaderboard_snapshot['version'] + 1
+                        leaderboard_snapshot = {
+                            'version': version,
+                            'records': records,
+                            'payload': b'{"version":%d,"data":%b}' % (version, records)
+                        }
+                        snapshot = leaderboard_snapshot
+                # Emit the leaderboard data to all connected clients as one binary frame
+                if snapshot is not None:
+                    socketio.emit('update_leaderboard', snapshot['payload'])
         except Exception as e:
             print(f"Error fetching leaderboard: {e}")
-            time.sleep(30)
+        # Schedule against the monotonic clock so fetch time doesn't stretch the cadence
+        # (after an overrun, restart from now instead of firing back-to-back fetches)
+        next_tick = max(next_tick + 30, time.monotonic())
+        socketio.sleep(max(0, next_tick - time.monotonic()))
 
 @socketio.on('connect')
-def on_connect():
-    emit('update_leaderboard', leaderboard_data)  # Send initial data to the client on connect
+def on_connect(auth=None):
+    with snapshot_lock:
+        snapshot = leaderboard_snapshot
+    # Clients may send the version they last saw to skip an unchanged resend
+    last_seen = auth.get('version') if isinstance(auth, dict) else None
+    if snapshot['version'] and snapshot['version'] != last_seen:
+        emit('update_leaderboard', snapshot['payload'])  # Send initial data to the client on connect
 
 if __name__ == "__main__":
-    # Start the background thread for fetching leaderboard data
-    threading.Thread(target=background_fetch_leaderboard, daemon=True).start()
+    # Start the background task for fetching leaderboard data; SocketIO picks the
+    # thread or green thread that matches its async mode
+    socketio.start_background_task(background_fetch_leaderboard)
     # Run the Flask-SocketIO app
     socketio.run(app, debug=True, port=5000)